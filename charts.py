@@ -1,10 +1,21 @@
 # charts.py
+import io
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
+import matplotlib.image as mpimg
 from matplotlib.colors import TwoSlopeNorm
 import matplotlib.patheffects as pe
+from matplotlib.collections import PatchCollection
+from matplotlib.text import Text
+from matplotlib.image import AxesImage
+from matplotlib.figure import Figure
+from typing import NamedTuple, Tuple
+import plotly.graph_objects as go
+from PIL import Image
 
 NAVY = "#182735"
 RED  = "#b1483f"
@@ -22,94 +33,311 @@ def _pivot(weekly: pd.DataFrame, value="Gap") -> pd.DataFrame:
     p.columns = [pd.to_datetime(c).strftime("%m/%d/%Y") for c in p.columns]
     return p
 
-def _luminance(rgb):
-    """Perceived luminance for text color decision (rgb in 0..1)."""
-    r, g, b = rgb[:3]
-    return 0.2126 * r + 0.7152 * g + 0.0722 * b
+# Legend icons, decoded once at import; missing files are skipped
+_LEGEND_ICONS = {
+    "Account": "icons/account.png",
+    "Creative": "icons/creative.png",
+    "PR": "icons/pr.png",
+    "Project Management": "icons/project.png",
+    "Strategy": "icons/strategy.png",
+    "Tech": "icons/tech.png",
+    "Video": "icons/video.png",
+}
+_ICONS = {dept: mpimg.imread(path) for dept, path in _LEGEND_ICONS.items() if Path(path).exists()}
+
+# Legend layout: department groups and the (col, row) cell of each
+_LEGEND_GROUPS = {
+    "Account": ["Account"],
+    "Creative": ["Creative - Designer", "Creative - Writer"],
+    "PR": ["PR - Traditional", "PR - Social"],
+    "Project Management": ["Project Management"],
+    "Strategy": ["Strategy"],
+    "Tech": ["Tech - Front-end", "Tech - Back-end"],
+    "Video": ["Video"],
+}
+_LEGEND_POSITIONS = [
+    (0, 1), (1, 1), (2, 1), (3, 1),
+    (0, 0), (1, 0), (2, 0)
+]
+
+# Tallest cell per row, so cells in a row share one height. A cell holds
+# the dept name, one line per sub-department, the total, and two icon lines.
+_LEGEND_ROW_HEIGHTS = {
+    row: max(
+        0.05 * (len(subs) + 4)
+        for subs, (_, r) in zip(_LEGEND_GROUPS.values(), _LEGEND_POSITIONS) if r == row
+    )
+    for row in (0, 1)
+}
 
-def make_heatmap_figure(
-    weekly: pd.DataFrame,
-    available,
-    title: str,
-    dept_order=None,
-    annotate_fmt="{:.1f}",
-):
+_LUMA = np.array([0.2126, 0.7152, 0.0722])
+
+def _luminance(rgb):
+    """Perceived luminance for text color decision (rgb(a) in 0..1 on the last axis)."""
+    return np.asarray(rgb)[..., :3] @ _LUMA
+
+# Colormap entries dark enough to need white label text
+_DARK_LUT = _luminance(_CMAP(np.arange(_CMAP.N))) < 0.5
+
+def _cell_masks(data: np.ndarray, norm) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-cell (balanced white band, dark colormap background) masks.
+
+    The dark test gathers from _DARK_LUT with the colormap's own lookup
+    index, so no per-cell RGBA array is built.
+    """
+    finite = np.isfinite(data)
+    band = finite & (np.abs(data) <= 0.9)
+    normed = np.where(finite, np.ma.getdata(norm(data)), 0.0)
+    idx = np.clip((normed * _CMAP.N).astype(int), 0, _CMAP.N - 1)
+    dark = finite & ~band & _DARK_LUT[idx]
+    return band, dark
+
+# Past this many cells the per-cell labels are unreadable and dominate the
+# render time, so heat maps are drawn as the colored grid only
+MAX_ANNOTATED_CELLS = 2000
+
+# Label strokes, shared by every heat map label of the same color
+_STROKE_BLACK = [pe.withStroke(linewidth=1.0, foreground="black")]
+_STROKE_WHITE = [pe.withStroke(linewidth=1.0, foreground="white")]
+
+# Per-cell colors of the balanced-band overlay
+_BAND_FACE = mcolors.to_rgba("white")
+_BAND_EDGE = mcolors.to_rgba("lightgray")
+
+
+class HeatmapCanvas(NamedTuple):
+    """Reusable figure and per-cell artists for a fixed-shape heat map.
+
+    drawn records what the last draw_heatmap call left on the canvas, so the
+    next one only touches what changed.
+    """
+    fig: plt.Figure
+    ax: plt.Axes
+    im: AxesImage
+    band: PatchCollection
+    texts: np.ndarray
+    cbar: object
+    drawn: dict
+
+
+def heatmap_pivot(weekly: pd.DataFrame, dept_order=None) -> pd.DataFrame:
+    """Department x week grid of gaps, as drawn by the heat map."""
     pivot = _pivot(weekly, "Gap")
     if dept_order is not None:
         pivot = pivot.reindex(dept_order)
+    return pivot
 
-    data = pivot.values.astype(float)
-    # Handle empty or all-NaN cases gracefully
-    if data.size == 0 or np.all(~np.isfinite(data)):
-        fig, ax = plt.subplots(figsize=(11, 6))
-        ax.text(0.5, 0.5, "No data for selected period", ha="center", va="center")
-        ax.axis("off")
-        return fig
 
-    # Color normalization centered at 0
+def _gap_norm(data: np.ndarray) -> TwoSlopeNorm:
+    """Color normalization centered at 0 over the finite values of data."""
     finite_vals = data[np.isfinite(data)]
     vmin = float(np.min(finite_vals)) if finite_vals.size else -5.0
     vmax = float(np.max(finite_vals)) if finite_vals.size else 5.0
     # Ensure both sides exist so TwoSlopeNorm works nicely
     if vmin >= 0: vmin = -1.0
     if vmax <= 0: vmax =  1.0
-    norm = TwoSlopeNorm(vmin=vmin, vcenter=0.0, vmax=vmax)
+    return TwoSlopeNorm(vmin=vmin, vcenter=0.0, vmax=vmax)
 
+
+def _no_data_figure():
     fig, ax = plt.subplots(figsize=(11, 6))
-    im = ax.imshow(data, cmap=_CMAP, norm=norm, aspect="auto")
-
-    # Force the balanced band (-0.9..0.9) to white background
-    rows, cols = data.shape
-    for i in range(rows):
-        for j in range(cols):
-            val = data[i, j]
-            if np.isfinite(val) and (-0.9 <= val <= 0.9):
-                ax.add_patch(
-                    plt.Rectangle(
-                        (j - 0.5, i - 0.5),
-                        1, 1,
-                        facecolor="white",
-                        edgecolor="lightgray",
-                        lw=0.6
-                    )
-                )
-
-    # Axes ticks/labels
-    ax.set_xticks(np.arange(cols))
-    ax.set_yticks(np.arange(rows))
-    ax.set_xticklabels(list(pivot.columns), rotation=45, ha="right")
-    ax.set_yticklabels(list(pivot.index))
-
-    # Annotations with automatic contrast
-    for i in range(rows):
-        for j in range(cols):
-            val = data[i, j]
-            if not np.isfinite(val):
-                continue
+    ax.text(0.5, 0.5, "No data for selected period", ha="center", va="center")
+    ax.axis("off")
+    return fig
 
-            # Default text color is black; switch to white if background is dark
-            if -0.9 <= val <= 0.9:
-                # Balanced band: white background → black text
-                text_color = "black"
-            else:
-                rgba = _CMAP(norm(val))
-                text_color = "white" if _luminance(rgba) < 0.5 else "black"
 
-            ax.text(
-                j, i, annotate_fmt.format(val),
-                ha="center", va="center",
-                fontsize=8, color=text_color,
-                path_effects=[pe.withStroke(linewidth=1.0, foreground="black" if text_color=="white" else "white")]
-            )
+def new_heatmap_canvas(rows: int, cols: int) -> HeatmapCanvas:
+    """Build the axes, colorbar and one overlay patch + label per cell, all blank."""
+    fig, ax = plt.subplots(figsize=(11, 6))
+    im = ax.imshow(
+        np.zeros((rows, cols)), cmap=_CMAP,
+        norm=TwoSlopeNorm(vmin=-1.0, vcenter=0.0, vmax=1.0), aspect="auto"
+    )
 
-    ax.set_title(title)
+    # Balanced-band overlay: every cell gets a patch, recolored per draw
+    band = PatchCollection(
+        [plt.Rectangle((j - 0.5, i - 0.5), 1, 1) for i, j in np.ndindex(rows, cols)],
+        facecolor="none",
+        edgecolor="none",
+        lw=0.6
+    )
+    ax.add_collection(band, autolim=False)
+
+    texts = np.empty((rows, cols), dtype=object)
+    if rows * cols <= MAX_ANNOTATED_CELLS:
+        for i, j in np.ndindex(rows, cols):
+            texts[i, j] = ax.add_artist(Text(j, i, "", ha="center", va="center", fontsize=8))
+
+    ax.set_xticks(np.arange(cols))
+    ax.set_yticks(np.arange(rows))
     ax.set_xlabel("Week Starting")
     ax.set_ylabel("Department")
 
     cbar = fig.colorbar(im, ax=ax)
     cbar.set_label("Headcount Gap")
+    drawn = {
+        "labels": np.full((rows, cols), "", dtype=object),
+        "dark": np.zeros((rows, cols), dtype=bool),
+        "layout": None,
+    }
+    return HeatmapCanvas(fig, ax, im, band, texts, cbar, drawn)
+
+
+def draw_heatmap(canvas: HeatmapCanvas, pivot: pd.DataFrame, title: str, annotate_fmt="{:.1f}"):
+    """Draw pivot (same shape as the canvas) into the canvas' existing artists."""
+    fig, ax, im, band_cells, texts, cbar, drawn = canvas
+    data = pivot.to_numpy(dtype=float)
+    finite = np.isfinite(data)
+    norm = _gap_norm(data)
+
+    im.set_data(data)
+    im.set_norm(norm)
+
+    # Force the balanced band (-0.9..0.9) to white background; labels are
+    # black on the band and white wherever the colormap background is dark
+    band, dark = _cell_masks(data, norm)
+    face = np.zeros((band.size, 4))
+    edge = np.zeros((band.size, 4))
+    face[band.ravel()] = _BAND_FACE
+    edge[band.ravel()] = _BAND_EDGE
+    band_cells.set_facecolor(face)
+    band_cells.set_edgecolor(edge)
+
+    # Annotations with automatic contrast; only cells whose label or
+    # contrast differ from the previous draw are touched. Canvases too large
+    # to annotate have no label artists at all.
+    if data.size <= MAX_ANNOTATED_CELLS:
+        fmt = annotate_fmt.format
+        labels = np.full(data.shape, None, dtype=object)
+        labels[finite] = [fmt(v) for v in data[finite]]
+        changed = (labels != drawn["labels"]) | (dark != drawn["dark"])
+        for i, j in zip(*np.nonzero(changed)):
+            t = texts[i, j]
+            if labels[i, j] is None:
+                t.set_visible(False)
+                continue
+            is_dark = dark[i, j]
+            t.set_text(labels[i, j])
+            t.set_color("white" if is_dark else "black")
+            t.set_path_effects(_STROKE_BLACK if is_dark else _STROKE_WHITE)
+            t.set_visible(True)
+        drawn["labels"], drawn["dark"] = labels, dark
+
+    # The layout solve measures every tick label, so it only reruns when the
+    # texts around the axes changed: tick labels, title, or the width of the
+    # widest colorbar label (digits share one advance width)
+    cbar_ticks = cbar.formatter.format_ticks(cbar.locator.tick_values(norm.vmin, norm.vmax))
+    layout = (
+        tuple(pivot.columns), tuple(pivot.index), title,
+        max(map(len, cbar_ticks), default=0),
+    )
+    if layout != drawn["layout"]:
+        ax.set_xticklabels(list(pivot.columns), rotation=45, ha="right")
+        ax.set_yticklabels(list(pivot.index))
+        ax.set_title(title)
+        fig.tight_layout()
+        drawn["layout"] = layout
+    return fig
 
-    fig.tight_layout()
+
+def make_heatmap_figure(
+    weekly: pd.DataFrame,
+    available,
+    title: str,
+    dept_order=None,
+    annotate_fmt="{:.1f}",
+):
+    pivot = heatmap_pivot(weekly, dept_order)
+
+    # Handle empty or all-NaN cases gracefully
+    if pivot.size == 0 or not np.isfinite(pivot.to_numpy(dtype=float)).any():
+        return _no_data_figure()
+
+    canvas = new_heatmap_canvas(*pivot.shape)
+    return draw_heatmap(canvas, pivot, title, annotate_fmt)
+
+def figure_png(fig, dpi: int = 150) -> bytes:
+    """Rasterize fig once to PNG bytes (for caching and image-only PDF pages)."""
+    buf = io.BytesIO()
+    # The PNG is only an intermediate (the PDF backend recompresses the
+    # pixels), so favour encoding speed over size
+    fig.savefig(buf, format="png", dpi=dpi, pil_kwargs={"compress_level": 1})
+    return buf.getvalue()
+
+
+def png_page(png: bytes, dpi: int = 150) -> Figure:
+    """Full-page figure showing a PNG from figure_png pixel for pixel.
+
+    Saving it through the PDF backend embeds a single image instead of
+    laying out fonts and paths for every artist of the original figure.
+    """
+    # Decoded as opaque 8-bit RGB, which the PDF backend embeds as is;
+    # mpimg.imread would expand it to float RGBA first
+    img = np.asarray(Image.open(io.BytesIO(png)).convert("RGB"))
+    h, w = img.shape[:2]
+    page = Figure(figsize=(w / dpi, h / dpi))
+    ax = page.add_axes([0, 0, 1, 1])
+    ax.imshow(img, interpolation="none")
+    ax.axis("off")
+    return page
+
+
+def _plotly_colorscale(norm: TwoSlopeNorm) -> list:
+    """Plotly colorscale reproducing _CMAP under norm, with the balanced band forced to white."""
+    span = norm.vmax - norm.vmin
+    lo, hi = max(-0.9, norm.vmin), min(0.9, norm.vmax)
+    pos_lo, pos_hi = (lo - norm.vmin) / span, (hi - norm.vmin) / span
+    scale = [[pos_lo, "#ffffff"], [pos_hi, "#ffffff"]]
+    if lo > norm.vmin:
+        scale = [[0.0, RED], [pos_lo, mcolors.to_hex(_CMAP(norm(lo)))]] + scale
+    if hi < norm.vmax:
+        scale = scale + [[pos_hi, mcolors.to_hex(_CMAP(norm(hi)))], [1.0, NAVY]]
+    return scale
+
+
+def make_heatmap_plotly(
+    weekly: pd.DataFrame,
+    available,
+    title: str,
+    dept_order=None,
+    annotate_fmt="{:.1f}",
+) -> go.Figure:
+    """Interactive version of make_heatmap_figure, rendered in the browser."""
+    pivot = heatmap_pivot(weekly, dept_order)
+    data = pivot.to_numpy(dtype=float)
+    finite = np.isfinite(data)
+
+    fig = go.Figure()
+    if not finite.any():
+        fig.add_annotation(text="No data for selected period", showarrow=False,
+                           x=0.5, y=0.5, xref="paper", yref="paper")
+        fig.update_xaxes(visible=False)
+        fig.update_yaxes(visible=False)
+        return fig
+
+    norm = _gap_norm(data)
+    fmt = annotate_fmt.format
+    text = [[fmt(v) if ok else "" for v, ok in zip(row, row_ok)] for row, row_ok in zip(data, finite)]
+    # Large grids keep the values on hover only
+    annotate = data.size <= MAX_ANNOTATED_CELLS
+    fig.add_trace(go.Heatmap(
+        z=data,
+        x=list(pivot.columns),
+        y=list(pivot.index),
+        zmin=norm.vmin,
+        zmax=norm.vmax,
+        colorscale=_plotly_colorscale(norm),
+        text=text,
+        texttemplate="%{text}" if annotate else "",
+        hovertemplate="%{y}<br>%{x}<br>Gap: %{text}<extra></extra>",
+        colorbar={"title": {"text": "Headcount Gap"}},
+    ))
+    fig.update_layout(
+        title=title,
+        xaxis={"title": "Week Starting", "type": "category", "tickangle": -45},
+        yaxis={"title": "Department", "type": "category", "autorange": "reversed"},
+        height=550,
+    )
     return fig
 
 
@@ -118,27 +346,6 @@ def legend_box(available_series: pd.Series):
     """Legend with PNG icons, centered text, bold totals, row-equalized cell heights."""
     from matplotlib.patches import Rectangle
     from matplotlib.offsetbox import OffsetImage, AnnotationBbox
-    import matplotlib.image as mpimg
-
-    groups = {
-        "Account": ["Account"],
-        "Creative": ["Creative - Designer", "Creative - Writer"],
-        "PR": ["PR - Traditional", "PR - Social"],
-        "Project Management": ["Project Management"],
-        "Strategy": ["Strategy"],
-        "Tech": ["Tech - Front-end", "Tech - Back-end"],
-        "Video": ["Video"],
-    }
-
-    icons = {
-        "Account": "icons/account.png",
-        "Creative": "icons/creative.png",
-        "PR": "icons/pr.png",
-        "Project Management": "icons/project.png",
-        "Strategy": "icons/strategy.png",
-        "Tech": "icons/tech.png",
-        "Video": "icons/video.png",
-    }
 
     def make_lines(subs):
         lines = [f"{d}: {int(available_series.get(d, 0))}" for d in subs]
@@ -146,13 +353,7 @@ def legend_box(available_series: pd.Series):
         lines.append(f"Total: {total}")
         return lines
 
-    headers = list(groups.keys())
-    data = {h: make_lines(subs) for h, subs in groups.items()}
-
-    positions = [
-        (0, 1), (1, 1), (2, 1), (3, 1),
-        (0, 0), (1, 0), (2, 0)
-    ]
+    data = {h: make_lines(subs) for h, subs in _LEGEND_GROUPS.items()}
 
     fig, ax = plt.subplots(figsize=(12, 6))
     ax.axis("off")
@@ -166,18 +367,8 @@ def legend_box(available_series: pd.Series):
 
     cell_w = 0.22
 
-    # --- Compute tallest cell per row ---
-    row_heights = {0: 0, 1: 0}
-    for (dept, lines), (col, row) in zip(data.items(), positions):
-        n_text_lines = len(lines) + 1  # dept name + text lines
-        n_icon_lines = 2
-        total_lines = n_text_lines + n_icon_lines
-        cell_h = 0.05 * total_lines
-        if cell_h > row_heights[row]:
-            row_heights[row] = cell_h
-
-    for (dept, lines), (col, row) in zip(data.items(), positions):
-        cell_h = row_heights[row]  # equalized height per row
+    for (dept, lines), (col, row) in zip(data.items(), _LEGEND_POSITIONS):
+        cell_h = _LEGEND_ROW_HEIGHTS[row]  # equalized height per row
         y0 = 0.1 + row * 0.4
         x0 = 0.05 + col * cell_w
 
@@ -188,17 +379,14 @@ def legend_box(available_series: pd.Series):
         )
 
         # Icon
-        if dept in icons:
-            try:
-                img = mpimg.imread(icons[dept])
-                imagebox = OffsetImage(img, zoom=0.1)
-                ab = AnnotationBbox(
-                    imagebox, (x0 + cell_w/2, y0 + cell_h - 0.05),
-                    frameon=False, box_alignment=(0.5, 1), xycoords=ax.transAxes
-                )
-                ax.add_artist(ab)
-            except FileNotFoundError:
-                pass
+        img = _ICONS.get(dept)
+        if img is not None:
+            imagebox = OffsetImage(img, zoom=0.1)
+            ab = AnnotationBbox(
+                imagebox, (x0 + cell_w/2, y0 + cell_h - 0.05),
+                frameon=False, box_alignment=(0.5, 1), xycoords=ax.transAxes
+            )
+            ax.add_artist(ab)
 
         # Department name
         ax.text(
@@ -1,6 +1,7 @@
 import re
+import numpy as np
 import pandas as pd
-from typing import Tuple
+from typing import Optional, Tuple
 
 VALID_DEPARTMENTS = [
     "Creative - Designer",
@@ -18,73 +19,119 @@ VALID_DEPARTMENTS = [
 
 HOURS_PER_FTE = 32
 
+_START_DATE_RE = re.compile(r"Start Date:\s*(\d{1,2}/\d{1,2}/\d{4})")
+
 def extract_dates(df_head: pd.DataFrame) -> list:
-    months = df_head.iloc[3, 5:].ffill().tolist()
-    days   = df_head.iloc[4, 5:].tolist()
-    dates = []
-    for m, d in zip(months, days):
-        try:
-            m_str = str(m)
-            if " " in m_str:
-                month_name, year = m_str.split()
-                dates.append(pd.to_datetime(f"{month_name} {int(float(d))}, {year}"))
-            else:
-                dates.append(pd.NaT)
-        except Exception:
-            dates.append(pd.NaT)
-    return dates
-
-def parse_workamajig_csv(file_obj) -> Tuple[pd.DataFrame, pd.Timestamp]:
-    # Reset to start
+    # Row 3 holds "Month Year" (only on the first week of each month), row 4 the day
+    months = df_head.iloc[3, 5:].ffill().astype("string")
+    days = np.trunc(pd.to_numeric(df_head.iloc[4, 5:], errors="coerce")).astype("Int64")
+    combined = months + " " + days.astype("string")
+    dates = pd.to_datetime(combined, format="%B %Y %d", errors="coerce")
+    # Fall back to abbreviated month names ("Jan 2025")
+    dates = dates.fillna(pd.to_datetime(combined, format="%b %Y %d", errors="coerce"))
+    return dates.tolist()
+
+def parse_workamajig_csv(file_obj, window_weeks: Optional[int] = None) -> Tuple[pd.DataFrame, pd.Timestamp]:
+    # Read the whole export once; the report header and the hours table are
+    # both sliced out of the same raw grid. Header and hours share columns,
+    # so everything is read as text (no per-column type inference) and the
+    # hours are converted once afterwards.
     file_obj.seek(0)
-    head = pd.read_csv(file_obj, nrows=10)
+    raw = pd.read_csv(file_obj, header=None, dtype=str)
+    head = raw.iloc[1:11]
 
     start_text = str(head.iloc[0,0])
-    m = re.search(r"Start Date:\\s*([0-9]{1,2}/[0-9]{1,2}/[0-9]{4})", start_text)
-    report_date = pd.to_datetime(m.group(1)) if m else pd.Timestamp.today().normalize()
+    m = _START_DATE_RE.search(start_text)
+    report_date = pd.to_datetime(m.group(1), format="%m/%d/%Y") if m else pd.Timestamp.today().normalize()
 
     dates = extract_dates(head)
 
-    # Reset again before full read
-    file_obj.seek(0)
-    df = pd.read_csv(file_obj, skiprows=6)
-    df = df.rename(columns={df.columns[1]: "Name"})
-    df = df.iloc[:, :5+len(dates)]
-    df.columns = list(df.columns[:5]) + dates
-    df = df.drop(columns=["Unnamed: 0","Unnamed: 2","Unnamed: 3","Unnamed: 4"], errors="ignore")
-
-    long = df.melt(id_vars=["Name"], var_name="Week", value_name="Hours")
-    long["Hours"] = pd.to_numeric(long["Hours"], errors="coerce").fillna(0)
+    # Weeks outside the reporting window are dropped before the reshape
+    week_idx = list(range(len(dates)))
+    if window_weeks is not None:
+        end = report_date + pd.Timedelta(weeks=window_weeks)
+        week_idx = [k for k, d in enumerate(dates) if pd.notna(d) and report_date < d <= end]
+
+    # Row 6 is the table header; keep the name column and one column per week
+    names = raw.iloc[7:, 1].to_numpy()
+    weeks = pd.DatetimeIndex([dates[k] for k in week_idx])
+    cells = raw.iloc[7:, [5 + k for k in week_idx]].to_numpy().ravel()
+
+    # The hours block is already dense (names x weeks), so the long frame is
+    # its row-major ravel. Unbooked (blank or zero) cells add nothing to any
+    # sum and are dropped here, before the merge and aggregation.
+    hours = pd.to_numeric(cells, errors="coerce").astype(np.float32)
+    row, col = np.divmod(np.flatnonzero(~np.isnan(hours) & (hours != 0)), len(weeks))
+
+    # Week keeps every week of the report as a category, so weeks with no
+    # bookings at all still get a (zero) column downstream
+    week_cats = weeks.dropna().unique().sort_values()
+    long = pd.DataFrame({
+        "Name": names[row],
+        "Week": pd.Categorical.from_codes(week_cats.get_indexer(weeks)[col], week_cats),
+        "Hours": hours[row * len(weeks) + col],
+    })
     return long, report_date
 
 
-def build_weekly_headcount(long_df: pd.DataFrame, employees_df: pd.DataFrame, services_df: pd.DataFrame, report_date: pd.Timestamp, window_weeks: int = 12):
+def build_headcount_grid(long_df: pd.DataFrame, employees_df: pd.DataFrame, services_df: pd.DataFrame) -> Tuple[np.ndarray, pd.DatetimeIndex, pd.Series]:
+    """Dense FTE demand grid (VALID_DEPARTMENTS x weeks), its weeks, and available staff per department."""
     emp = employees_df.rename(columns={"Resource Name":"Name"})[["Name","Department"]]
     svc = services_df.rename(columns={"Service":"Name"})[["Name","Department"]]
     mapping = pd.concat([emp, svc], ignore_index=True)
 
-    merged = long_df.merge(mapping, on="Name", how="left")
-    merged = merged[merged["Department"].isin(VALID_DEPARTMENTS)]
-
-    merged["Headcount_Demand"] = merged["Hours"] / HOURS_PER_FTE
+    # Shared categories let the merge join on integer codes instead of strings
+    names = pd.CategoricalDtype(pd.concat([long_df["Name"], mapping["Name"]]).dropna().unique())
+    long_df = long_df.assign(Name=long_df["Name"].astype(names))
+    mapping["Name"] = mapping["Name"].astype(names)
 
-    weekly = (
-        merged.groupby(["Department","Week"], dropna=True)["Headcount_Demand"]
-        .sum().reset_index()
-    )
+    merged = long_df.merge(mapping, on="Name", how="left")
+    merged["Department"] = pd.Categorical(merged["Department"], categories=VALID_DEPARTMENTS)
+    merged = merged[merged["Department"].notna() & merged["Week"].notna()]
+
+    # Both keys become small integer codes and the FTE demand is summed
+    # with a single bincount. The week axis comes from the categories, not
+    # the surviving rows, so unbooked weeks are kept.
+    dcode = merged["Department"].cat.codes.to_numpy(dtype=np.intp)
+    week = merged["Week"].astype("category")
+    wcode, weeks = week.cat.codes.to_numpy(dtype=np.intp), week.cat.categories
+    n_weeks = len(weeks)
+    demand = np.bincount(
+        dcode * n_weeks + wcode,
+        weights=merged["Hours"].to_numpy(dtype=float) / HOURS_PER_FTE,
+        minlength=len(VALID_DEPARTMENTS) * n_weeks,
+    ).reshape(len(VALID_DEPARTMENTS), n_weeks)
 
     available = (
         employees_df.groupby("Department")["Resource Name"].count()
         .reindex(VALID_DEPARTMENTS).fillna(0).astype(int)
     )
 
-    weekly["Available"] = weekly["Department"].map(available.to_dict())
-    weekly["Gap"] = weekly["Available"] - weekly["Headcount_Demand"]
+    return demand, pd.DatetimeIndex(weeks, name="Week"), available
 
-    mask = (weekly["Week"] > report_date) & (weekly["Week"] <= report_date + pd.Timedelta(weeks=window_weeks))
-    weekly = weekly[mask].copy()
 
-    return weekly, available
+def grid_to_weekly(grid: np.ndarray, weeks: pd.DatetimeIndex, available: pd.Series, report_date: pd.Timestamp, window_weeks: int) -> pd.DataFrame:
+    """Long Department/Week frame of demand, availability and gap for the weeks in the window."""
+    in_window = (weeks > report_date) & (weeks <= report_date + pd.Timedelta(weeks=window_weeks))
+
+    weekly = (
+        pd.DataFrame(
+            grid[:, in_window],
+            index=pd.CategoricalIndex(VALID_DEPARTMENTS, categories=VALID_DEPARTMENTS, name="Department"),
+            columns=weeks[in_window],
+        )
+        .stack().rename("Headcount_Demand").reset_index()
+    )
+
+    # Department codes index straight into the VALID_DEPARTMENTS-ordered counts
+    weekly["Available"] = available.to_numpy()[weekly["Department"].cat.codes.to_numpy()]
+    weekly["Gap"] = weekly["Available"].to_numpy() - weekly["Headcount_Demand"].to_numpy()
+    return weekly
+
+
+def build_weekly_headcount(long_df: pd.DataFrame, employees_df: pd.DataFrame, services_df: pd.DataFrame, report_date: pd.Timestamp, window_weeks: int = 12):
+    grid, weeks, available = build_headcount_grid(long_df, employees_df, services_df)
+    return grid_to_weekly(grid, weeks, available, report_date, window_weeks), available
 
 def load_definitions(xlsx_file):
     xls = pd.ExcelFile(xlsx_file)
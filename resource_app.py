@@ -1,17 +1,44 @@
 import io
 import datetime
+import hashlib
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import streamlit as st
+import numpy as np
 import pandas as pd
+import matplotlib
+
+# Figures are only ever rendered to files on the server: no GUI backend.
+# Session canvases are detached from pyplot (see _heatmap_figure), so the
+# open-figure count says nothing useful here.
+matplotlib.use("Agg")
+matplotlib.rcParams.update({
+    "path.simplify": True,
+    "path.simplify_threshold": 1.0,
+    "agg.path.chunksize": 10000,
+    "figure.max_open_warning": 0,
+})
+import matplotlib.pyplot as plt
 from matplotlib.backends.backend_pdf import PdfPages
 
 from parsing import (
     load_definitions,
     parse_workamajig_csv,
-    build_weekly_headcount,
+    build_headcount_grid,
+    grid_to_weekly,
+)
+from charts import (
+    draw_heatmap,
+    figure_png,
+    heatmap_pivot,
+    make_heatmap_figure,
+    make_heatmap_plotly,
+    new_heatmap_canvas,
+    png_page,
 )
-from charts import make_heatmap_figure
 
 st.set_page_config(page_title="Hart Heat Maps", layout="wide")
 
@@ -21,6 +48,18 @@ st.title("📊 Hart Staffing Heat Map")
 DATA_DIR = Path("hart_app/data")
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 DEFS_PATH = DATA_DIR / "Service-Staff-Definitions.xlsx"
+# Arrow copies of the definitions sheets, written next to the workbook on upload
+EMPLOYEES_PATH = DATA_DIR / "employees.feather"
+SERVICES_PATH = DATA_DIR / "services.feather"
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _file_digest(path: str, mtime: float) -> bytes:
+    # The workbook on disk only changes through an upload (new mtime), so
+    # it is hashed once per version rather than on every new upload id
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "blake2b").digest()
+
 
 # --- Sidebar ---
 with st.sidebar:
@@ -29,9 +68,25 @@ with st.sidebar:
     # Definitions uploader
     st.subheader("Definitions")
     defs_uploader = st.file_uploader("Service-Staff-Definitions.xlsx", type=["xlsx"], key="defs")
-    if defs_uploader:
-        with open(DEFS_PATH, "wb") as f:
-            f.write(defs_uploader.read())
+    if defs_uploader and st.session_state.get("defs_file_id") != defs_uploader.file_id:
+        # Re-uploading the workbook already on disk leaves it (and the caches
+        # keyed on its mtime) untouched
+        defs_uploader.seek(0)
+        upload_digest = hashlib.file_digest(defs_uploader, "blake2b").digest()
+        disk_digest = None
+        if DEFS_PATH.exists():
+            disk_digest = _file_digest(str(DEFS_PATH), DEFS_PATH.stat().st_mtime)
+
+        if upload_digest != disk_digest:
+            defs_uploader.seek(0)
+            with open(DEFS_PATH, "wb") as f:
+                shutil.copyfileobj(defs_uploader, f, length=1 << 20)
+            # Only the columns the pipeline uses are persisted; free-form columns
+            # in the workbook may mix types that Arrow refuses to store
+            employees, services = load_definitions(DEFS_PATH)
+            employees[["Resource Name", "Department"]].to_feather(EMPLOYEES_PATH)
+            services[["Service", "Department"]].to_feather(SERVICES_PATH)
+        st.session_state["defs_file_id"] = defs_uploader.file_id
 
     # Workload CSV uploader
     st.subheader("Workload CSV")
@@ -41,148 +96,235 @@ with st.sidebar:
 
 # --- Main App ---
 
+# Streamlit re-runs this whole script on every widget interaction, so the
+# pure pipeline steps are memoized on their inputs. Every new upload adds an
+# entry, so the caches are bounded to the last few files.
+@st.cache_data(show_spinner=False, max_entries=8)
+def _load_definitions(path: str, mtime: float):
+    # mtime is only part of the cache key: a new upload invalidates the entry
+    feathers = [EMPLOYEES_PATH, SERVICES_PATH]
+    if all(p.exists() and p.stat().st_mtime >= mtime for p in feathers):
+        return tuple(pd.read_feather(p) for p in feathers)
+    return load_definitions(path)
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _parse_csv(csv_hash: str, _data: bytes, window_weeks: int):
+    # Keyed on the digest the caller already computed; Streamlit would
+    # otherwise hash the whole upload a second time
+    return parse_workamajig_csv(io.BytesIO(_data), window_weeks=window_weeks)
+
+
+# The aggregation steps are keyed on a fingerprint of their source files
+# (CSV digest, definitions mtime) instead of their frame arguments, which
+# Streamlit would otherwise hash on every rerun. Underscored parameters are
+# excluded from the key.
+@st.cache_data(show_spinner=False, max_entries=8)
+def _headcount_grid(csv_hash: str, defs_mtime: float, _long_df, _employees_df, _services_df):
+    return build_headcount_grid(_long_df, _employees_df, _services_df)
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _weekly(csv_hash: str, defs_mtime: float, window_weeks: int, _grid, _weeks, _available, _report_date):
+    return grid_to_weekly(_grid, _weeks, _available, _report_date, window_weeks)
+
+
+# Figures are keyed the same way: data_key is the (CSV digest, definitions
+# mtime) fingerprint and the title tells the windows apart.
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _heatmap_plotly(data_key, title, _weekly, _available):
+    # st.plotly_chart only serializes the figure, so one instance can be
+    # shared by every session
+    return make_heatmap_plotly(_weekly, _available, title=title)
+
+
+def _heatmap_figure(data_key, weekly, available, title):
+    # Each view keeps one canvas per session and only redraws its artists.
+    # Canvases live in session state rather than st.cache_resource because a
+    # figure mutated in place must not be shared between concurrent sessions.
+    pivot = heatmap_pivot(weekly)
+    if not np.isfinite(pivot.to_numpy(dtype=float)).any():
+        return make_heatmap_figure(weekly, available, title=title)
+
+    canvases = st.session_state.setdefault("heatmap_canvases", {})
+    drawn_key, canvas = canvases.get(title, (None, None))
+    if drawn_key == data_key:
+        return canvas.fig
+    if canvas is None or canvas.texts.shape != pivot.shape:
+        canvas = new_heatmap_canvas(*pivot.shape)
+        # pyplot would keep the figure alive after the session is gone;
+        # detached, it lives exactly as long as the session state holding it
+        plt.close(canvas.fig)
+    canvases[title] = (data_key, canvas)
+    return draw_heatmap(canvas, pivot, title)
+
+
+# The report is built once per distinct content; preparing it again (or in
+# another session) reuses the cached bytes
+@st.cache_data(show_spinner=False, max_entries=8)
+def _pdf_report(data_key, _figures):
+    # The figures are set up here on the script thread, where the session's
+    # canvases live; rasterizing them is the expensive, independent part and
+    # runs concurrently
+    figs = _figures()
+    with ThreadPoolExecutor(max_workers=len(figs)) as ex:
+        pngs = list(ex.map(figure_png, figs))
+    # Releases the per-report figures (legend, no-data pages); the session
+    # canvases are already detached from pyplot, so this leaves them alone
+    for fig in figs:
+        plt.close(fig)
+
+    # Pages are written into a spooled file: small reports stay in memory,
+    # large ones spill to disk while the PDF is assembled
+    with tempfile.SpooledTemporaryFile(max_size=8 << 20, mode="w+b") as buf:
+        with PdfPages(buf) as pdf:
+            for png in pngs:
+                pdf.savefig(png_page(png))
+        buf.seek(0)
+        return buf.read()
+
+
+# Legend boxes in display order: (department, icon, roles it totals)
+_LEGEND_GROUPS = (
+    ("Account", "🧾", ("Account",)),
+    ("Creative", "🎨", ("Creative - Designer", "Creative - Writer")),
+    ("PR", "📢", ("PR - Traditional", "PR - Social")),
+    ("Project Management", "📋", ("Project Management",)),
+    ("Strategy", "🧭", ("Strategy",)),
+    ("Tech", "💻", ("Tech - Front-end", "Tech - Back-end")),
+    ("Video", "🎥", ("Video",)),
+)
+
+
 def make_pdf_legend(available):
-    import matplotlib.pyplot as plt
-
-    groups = {
-        "Account": ["Account"],
-        "Creative": ["Creative - Designer", "Creative - Writer"],
-        "PR": ["PR - Traditional", "PR - Social"],
-        "Project Management": ["Project Management"],
-        "Strategy": ["Strategy"],
-        "Tech": ["Tech - Front-end", "Tech - Back-end"],
-        "Video": ["Video"],
-    }
-
-    fig, ax = plt.subplots(figsize=(11, 6))
+    avail = pd.Series(available, dtype="int64")
+
+    # Everything is placed in axes coordinates on a full-page axes, so no
+    # layout solve is needed
+    fig = plt.figure(figsize=(11, 6))
+    ax = fig.add_axes([0, 0, 1, 1])
     ax.axis("off")
 
     ax.text(0.5, 0.95, "Current Staff Availability",
             ha="center", va="top", fontsize=16, fontweight="bold")
 
-    positions = [
-        (0, 1), (1, 1), (2, 1), (3, 1),
-        (0, 0), (1, 0), (2, 0)
-    ]
-    cell_w, cell_h = 0.22, 0.35
-
-    for (dept, subs), (col, row) in zip(groups.items(), positions):
-        x0, y0 = 0.05 + col * cell_w, 0.1 + row * cell_h
-        ax.add_patch(plt.Rectangle((x0, y0), cell_w, cell_h,
-                                   fill=False, lw=1.2, color="black",
-                                   transform=ax.transAxes))
-        ax.text(x0 + cell_w/2, y0 + cell_h - 0.05, dept,
-                ha="center", va="top", fontsize=12, fontweight="bold",
-                transform=ax.transAxes)
-
-        lines = [f"{d}: {int(available.get(d, 0))}" for d in subs]
-        total = int(sum(available.get(d, 0) for d in subs))
-        lines.append(f"Total: {total}")
-        for i, line in enumerate(lines):
-            ax.text(x0 + cell_w/2, y0 + cell_h - 0.15 - i*0.08, line,
-                    ha="center", va="top", fontsize=10,
-                    transform=ax.transAxes)
-
-    fig.tight_layout()
+    # One multi-line string per department box, laid out as a single table
+    # (four boxes on top, three below) instead of a patch and text per line
+    cells = []
+    for dept, _, subs in _LEGEND_GROUPS:
+        vals = avail.reindex(subs, fill_value=0)
+        lines = [f"{d}: {v}" for d, v in vals.items()]
+        total = int(vals.sum())
+        cells.append("\n".join([dept, "", *lines, f"Total: {total}"]))
+    cells.append("")
+
+    tbl = ax.table(cellText=[cells[:4], cells[4:]], cellLoc="center",
+                   bbox=[0.05, 0.1, 0.88, 0.7])
+    tbl.auto_set_font_size(False)
+    tbl.set_fontsize(10)
+    for cell in tbl.get_celld().values():
+        cell.set_linewidth(1.2)
+    tbl[1, 3].set_visible(False)
     return fig
 
 
-
+@st.cache_data(show_spinner=False, max_entries=8)
 def render_legend_html(available):
-    groups = {
-        "Account 🧾": ["Account"],
-        "Creative 🎨": ["Creative - Designer", "Creative - Writer"],
-        "PR 📢": ["PR - Traditional", "PR - Social"],
-        "Project Management 📋": ["Project Management"],
-        "Strategy 🧭": ["Strategy"],
-        "Tech 💻": ["Tech - Front-end", "Tech - Back-end"],
-        "Video 🎥": ["Video"],
-    }
-
-    rows = []
-    for dept, subs in groups.items():
-        lines = [f"{d}: {int(available.get(d, 0))}" for d in subs]
-        total = int(sum(available.get(d, 0) for d in subs))
-        emoji_icon = dept.split()[-1]
-        dept_name = " ".join(dept.split()[:-1])
-        html = f"""
-        <div style='text-align:center; font-family:sans-serif;'>
-            <span style='font-size:28px;'>{emoji_icon}</span><br>
-            <b>{dept_name}</b><br>
-            {'<br>'.join(lines)}<br>
-            <b>Total: {total}</b>
-        </div>
-        """
-        rows.append(html)
-
-    table_html = f"""
-    <h3 style='text-align:center;'>Current Staff Availability</h3>
-    <table style='margin:auto; border-collapse:collapse; font-family:sans-serif;'>
-      <tr>
-        {''.join(f'<td style="border:1px solid black; padding:10px; vertical-align:top;">{cell}</td>' for cell in rows[:4])}
-      </tr>
-      <tr>
-        {''.join(f'<td style="border:1px solid black; padding:10px; vertical-align:top;">{cell}</td>' for cell in rows[4:])}
-      </tr>
-    </table>
-    """
-    return table_html
+    avail = pd.Series(available, dtype="int64")
 
+    # Fragments are collected in one list and joined once at the end
+    parts = [
+        "<h3 style='text-align:center;'>Current Staff Availability</h3>",
+        "<table style='margin:auto; border-collapse:collapse; font-family:sans-serif;'><tr>",
+    ]
+    for k, (dept_name, emoji_icon, subs) in enumerate(_LEGEND_GROUPS):
+        if k == 4:
+            parts.append("</tr><tr>")
+        vals = avail.reindex(subs, fill_value=0)
+        lines = [f"{d}: {v}" for d, v in vals.items()]
+        total = int(vals.sum())
+        parts.extend([
+            '<td style="border:1px solid black; padding:10px; vertical-align:top;">',
+            "<div style='text-align:center; font-family:sans-serif;'>",
+            "<span style='font-size:28px;'>", emoji_icon, "</span><br>",
+            "<b>", dept_name, "</b><br>",
+            "<br>".join(lines), "<br>",
+            "<b>Total: ", str(total), "</b>",
+            "</div></td>",
+        ])
+    parts.append("</tr></table>")
+    return "".join(parts)
 
-if DEFS_PATH.exists() and active_csv:
-    # 1) Load definitions from persistent file
-    employees_df, services_df = load_definitions(DEFS_PATH)
-
-    # 2) Parse single CSV
-    active_long, report_date_active = parse_workamajig_csv(active_csv)
-
-    # 3) Weekly headcounts (two windows: 13 and 26 weeks)
-    weekly_13, available = build_weekly_headcount(
-        active_long, employees_df, services_df, report_date_active, window_weeks=13
-    )
-    weekly_26, _ = build_weekly_headcount(
-        active_long, employees_df, services_df, report_date_active, window_weeks=26
-    )
 
-    # 4) Figures
+if DEFS_PATH.exists() and active_csv:
+    defs_mtime = DEFS_PATH.stat().st_mtime
+    # The upload is read once; its bytes feed both the digest and the parser
+    csv_bytes = active_csv.getvalue()
+    csv_hash = hashlib.blake2b(csv_bytes).hexdigest()
+    data_key = (csv_hash, defs_mtime)
+
+    # Reruns on unchanged files (any widget interaction) reuse this session's
+    # last results without even consulting the caches
+    last_key, last_outputs = st.session_state.get("pipeline", (None, None))
+    if last_key == data_key:
+        weekly_13, weekly_26, available = last_outputs
+    else:
+        # 1) Load definitions from persistent file
+        employees_df, services_df = _load_definitions(str(DEFS_PATH), defs_mtime)
+
+        # 2) Parse single CSV, keeping only the weeks the widest heat map shows
+        active_long, report_date_active = _parse_csv(csv_hash, csv_bytes, 26)
+
+        # 3) Weekly headcounts: aggregate once into a department x week grid and
+        #    cut both windows (13 and 26 weeks) out of it
+        grid, weeks, available = _headcount_grid(csv_hash, defs_mtime, active_long, employees_df, services_df)
+        weekly_13 = _weekly(csv_hash, defs_mtime, 13, grid, weeks, available, report_date_active)
+        weekly_26 = _weekly(csv_hash, defs_mtime, 26, grid, weeks, available, report_date_active)
+        st.session_state["pipeline"] = (data_key, (weekly_13, weekly_26, available))
+
+    # 4) Figures, drawn client-side
+    title_13 = "Hart Heat Map — 13 Weeks"
+    title_26 = "Hart Heat Map — 26 Weeks"
     col1, col2 = st.columns([1, 1], gap="large")
 
-    fig_13 = make_heatmap_figure(
-        weekly_13,
-        available,
-        title="Hart Heat Map — 13 Weeks",
-    )
     with col1:
-        st.pyplot(fig_13, use_container_width=True)
+        st.plotly_chart(
+            _heatmap_plotly(data_key, title_13, weekly_13, available),
+            use_container_width=True,
+        )
 
-    fig_26 = make_heatmap_figure(
-        weekly_26,
-        available,
-        title="Hart Heat Map — 26 Weeks",
-    )
     with col2:
-        st.pyplot(fig_26, use_container_width=True)
+        st.plotly_chart(
+            _heatmap_plotly(data_key, title_26, weekly_26, available),
+            use_container_width=True,
+        )
 
     # 4b) Current staff availability legend
     st.subheader("Current Staff Availability")
     st.markdown(render_legend_html(available), unsafe_allow_html=True)
 
 
-    # 5) PDF export with both heat maps
-    buf = io.BytesIO()
-    today = datetime.date.today().strftime("%Y-%m-%d")
-    with PdfPages(buf) as pdf:
-        pdf.savefig(fig_13)
-        pdf.savefig(fig_26)
-        pdf.savefig(make_pdf_legend(available))
-    buf.seek(0)
-
-    st.download_button(
-        "⬇️ Download PDF Report",
-        data=buf,
-        file_name=f"hart-heat-maps-{today}.pdf",
-        mime="application/pdf",
-    )
+    # 5) PDF export with both heat maps (matplotlib). Rendering the pages is
+    #    expensive, so it only happens on request. The finished report is
+    #    kept in session state, so the download button survives reruns until
+    #    the data changes.
+    if st.button("📄 Prepare PDF Report"):
+        pdf_bytes = _pdf_report(data_key, lambda: [
+            _heatmap_figure(data_key, weekly_13, available, title_13),
+            _heatmap_figure(data_key, weekly_26, available, title_26),
+            make_pdf_legend(available),
+        ])
+        st.session_state["pdf_report"] = (data_key, pdf_bytes)
+
+    pdf_key, pdf_bytes = st.session_state.get("pdf_report", (None, None))
+    if pdf_key == data_key:
+        today = datetime.date.today().strftime("%Y-%m-%d")
+        st.download_button(
+            "⬇️ Download PDF Report",
+            data=pdf_bytes,
+            file_name=f"hart-heat-maps-{today}.pdf",
+            mime="application/pdf",
+        )
 
 else:
     st.info("⬆️ Upload the definitions file and a single workload CSV to generate the heat maps.")